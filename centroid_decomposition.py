@@ -1,31 +1,88 @@
 #!/usr/bin/env python3
 # Piotr Beling, 2026
 
+from array import array
+from heapq import heapify, heappop, heappush
+from itertools import accumulate
+import mmap
+import struct
+
 class Tree:
    
     def __init__(self, vert_count):
         self.adj = [[] for _ in range(vert_count)]
-        self._subtree_size = [0] * vert_count
-        self._removed = [False] * vert_count
+        self._subtree_size = array('i', bytes(4 * vert_count))
+        self._removed = bytearray(vert_count)
+        self._order = array('i', bytes(4 * vert_count))     # vertices of the component in BFS order
+        self._parent = array('i', bytes(4 * vert_count))    # parents in the BFS tree of the component
+        self._dist = None
+        self.weights = None     # None for unweighted tree, otherwise weights[v][i] is the weight of the edge v - adj[v][i]
+        self._up_weight = None  # weights of the edges to the parents in the BFS tree of the component
+        self._float_weights = False
        
-    def add_edge(self, a, b):
+    def add_edge(self, a, b, weight=None):
+        """Adds the edge a - b of the given weight (1 if None, the tree becomes weighted when the first weight is given)."""
         self.adj[a].append(b)
         self.adj[b].append(a)
+        if self.weights is None:
+            if weight is None: return
+            self.weights = [[1] * len(l) for l in self.adj]
+            self._up_weight = [0] * self.vert_count()
+        else:
+            self.weights[a].append(1)
+            self.weights[b].append(1)
+        if weight is not None:
+            self.weights[a][-1] = self.weights[b][-1] = weight
+            if isinstance(weight, float): self._float_weights = True
+            
+    def dist_typecode(self):
+        """Returns the typecode of the arrays of distances: 'i' for unweighted tree, 'q' for integer and 'd' for float weights."""
+        if self.weights is None: return 'i'
+        return 'd' if self._float_weights else 'q'
        
     def vert_count(self):
         return len(self.adj)
+    
+    def _component(self, start):
+        """Fills _order (with vertices in BFS order) and _parent for the component (of not removed vertices) that contains start.
+           Returns the number of vertices in the component."""
+        adj, removed, order, parent = self.adj, self._removed, self._order, self._parent
+        order[0] = start
+        parent[start] = -1
+        i, end = 0, 1
+        if self.weights is None:
+            while i < end:
+                v = order[i]
+                i += 1
+                p = parent[v]
+                for a in adj[v]:
+                    if a != p and not removed[a]:
+                        parent[a] = v
+                        order[end] = a
+                        end += 1
+        else:
+            weights, up_weight = self.weights, self._up_weight
+            while i < end:
+                v = order[i]
+                i += 1
+                p = parent[v]
+                for a, w in zip(adj[v], weights[v]):
+                    if a != p and not removed[a]:
+                        parent[a] = v
+                        up_weight[a] = w
+                        order[end] = a
+                        end += 1
+        return end
    
     def subtree_sizes(self, start):
-        def _subtree_sizes(v):
-            res = 1
-            self._removed[v] = True
-            for a in self.adj[v]:
-                if not self._removed[a]:
-                    res += _subtree_sizes(a)
-            self._removed[v] = False
-            self._subtree_size[v] = res
-            return res
-        return _subtree_sizes(start)
+        """Calculates sizes of subtrees of the component rooted at start. Returns the size of the component."""
+        vert_num = self._component(start)
+        order, parent, size = self._order, self._parent, self._subtree_size
+        for i in range(vert_num): size[order[i]] = 1
+        for i in range(vert_num-1, 0, -1):
+            v = order[i]
+            size[parent[v]] += size[v]
+        return vert_num
    
     def centroid(self, v):
         vert_num = self.subtree_sizes(v)
@@ -41,43 +98,319 @@ class Tree:
                 return v
            
     def shortest_paths(self, start, out_tab):
-        def _shortest_paths(v, dist):
-            out_tab[v].append((start, dist))
-            dist += 1
-            self._removed[v] = True
-            for a in self.adj[v]:
-                if not self._removed[a]:
-                    _shortest_paths(a, dist)
-            self._removed[v] = False
-        _shortest_paths(start, 0)
+        """Appends (start, distance from start) to out_tab[v] for each vertex v of the component that contains start."""
+        typecode = self.dist_typecode()
+        if self._dist is None or self._dist.typecode != typecode:
+            self._dist = array(typecode, bytes(array(typecode).itemsize * self.vert_count()))
+        vert_num = self._distances(start, self._dist)
+        for i in range(vert_num):
+            v = self._order[i]
+            out_tab[v].append((start, self._dist[v]))
+       
+    def _distances(self, start, out_dist):
+        """Sets out_dist[v] to the distance from start for each vertex v of the component that contains start.
+           Returns the number of vertices in the component."""
+        vert_num = self._component(start)
+        order, parent = self._order, self._parent
+        out_dist[start] = 0
+        if self.weights is None:
+            for i in range(1, vert_num):
+                v = order[i]
+                out_dist[v] = out_dist[parent[v]] + 1
+        else:
+            up_weight = self._up_weight
+            for i in range(1, vert_num):
+                v = order[i]
+                out_dist[v] = out_dist[parent[v]] + up_weight[v]
+        return vert_num
        
     def centroid_decomp(self):
-        def _centroid_decomp(start):
+        n = self.vert_count()
+        typecode = self.dist_typecode()
+        itemsize = array(typecode).itemsize
+        level = array('i', bytes(4 * n))    # level[c] - depth of the centroid c in the centroid tree
+        up = array('i', bytes(4 * n))       # up[c] - parent of the centroid c in the centroid tree
+        level_dist = []     # level_dist[l][v] - distance from v to its centroid at level l
+        stack = [(0, -1, 0)] if n else []   # (vertex of the component to decompose, parent centroid, level)
+        while stack:
+            start, parent_centroid, l = stack.pop()
             c = self.centroid(start)
-            self.shortest_paths(c, out_tab)
+            level[c] = l
+            up[c] = parent_centroid
+            if l == len(level_dist): level_dist.append(array(typecode, bytes(itemsize * n)))
+            self._distances(c, level_dist[l])
             self._removed[c] = True
             for a in self.adj[c]:
-                if not self._removed[a]:
-                    _centroid_decomp(a)
-            self._removed[c] = False
-       
-        out_tab = [[] for _ in range(tree.vert_count())]
-        _centroid_decomp(0)
-        return CentroidDecomp(out_tab)
+                if not self._removed[a]: stack.append((a, c, l+1))
+        self._removed[:] = bytes(n)
+        # the centroids of v are its ancestors in the centroid tree (including v itself):
+        offsets = array('q', accumulate((l+1 for l in level), initial=0))
+        centroids = array('i', bytes(4 * offsets[-1]))
+        dists = array(typecode, bytes(itemsize * offsets[-1]))
+        for v in range(n):
+            o = offsets[v]
+            c = v
+            for l in range(level[v], -1, -1):
+                centroids[o+l] = c
+                dists[o+l] = level_dist[l][v]
+                c = up[c]
+        return CentroidDecomp(offsets, centroids, dists)
+    
+    def lca_dist(self, root=0):
+        """Returns LCADist for the tree rooted at root."""
+        n = self.vert_count()
+        typecode = self.dist_typecode()
+        first = array('i', bytes(4 * n))    # first[v] - index of the first occurrence of v in the Euler tour
+        root_dist = array(typecode, bytes(array(typecode).itemsize * n))
+        depth = array('i', bytes(4 * n))
+        parent = self._parent
+        tour = array('q')   # keys (depth << 32 | vertex) of the vertices in the Euler tour
+        if n:
+            adj, weights = self.adj, self.weights
+            next_edge = array('i', bytes(4 * n))
+            parent[root] = -1
+            tour.append(root)
+            stack = [root]
+            while stack:
+                v = stack[-1]
+                i = next_edge[v]
+                if i == len(adj[v]):
+                    stack.pop()
+                    if stack: tour.append(depth[stack[-1]] << 32 | stack[-1])
+                    continue
+                next_edge[v] = i + 1
+                a = adj[v][i]
+                if a == parent[v]: continue
+                parent[a] = v
+                depth[a] = depth[v] + 1
+                root_dist[a] = root_dist[v] + (1 if weights is None else weights[v][i])
+                first[a] = len(tour)
+                tour.append(depth[a] << 32 | a)
+                stack.append(a)
+        return LCADist(first, root_dist, tour)
    
+class LCADist:
+    """Tree distances calculated from the lowest common ancestors, found in O(1) time
+       by the sparse table of minimums over the Euler tour of the tree, built in O(n log n) time."""
+    
+    def __init__(self, first, root_dist, tour):
+        self.first = first          # first[v] - index of the first occurrence of v in the tour
+        self.root_dist = root_dist  # root_dist[v] - distance from the root to v
+        self.table = [tour]         # table[k][i] - minimum of tour[i:i+2**k], the vertex with minimum depth is in its lower 32 bits
+        half = 1
+        while 2 * half <= len(tour):
+            prev = self.table[-1]
+            self.table.append(array('q', map(min, prev[:len(prev)-half], prev[half:])))
+            half *= 2
+        
+    def __len__(self):
+        return len(self.first)
+    
+    def lca(self, a, b):
+        """Returns the lowest common ancestor of a and b."""
+        l, r = self.first[a], self.first[b]
+        if l > r: l, r = r, l
+        k = (r - l + 1).bit_length() - 1
+        row = self.table[k]
+        return min(row[l], row[r - (1 << k) + 1]) & 0xFFFFFFFF
+        
+    def dist(self, a, b):
+        """Returns the shortest distance from a to b."""
+        root_dist = self.root_dist
+        return root_dist[a] + root_dist[b] - 2 * root_dist[self.lca(a, b)]
+    
+    def dist_many(self, a, b):
+        """Returns numpy array of the shortest distances from a[i] to b[i], for given arrays a and b of vertices."""
+        import numpy as np
+        first = np.frombuffer(self.first, np.int32)
+        root_dist = np.frombuffer(self.root_dist, memoryview(self.root_dist).format)
+        a = np.asarray(a, np.int64)
+        b = np.asarray(b, np.int64)
+        fa, fb = first[a], first[b]
+        l, r = np.minimum(fa, fb), np.maximum(fa, fb)
+        k = np.zeros(len(l), np.int64)  # k = floor(log2(r - l + 1))
+        length = r - l + 1
+        while True:
+            longer = (length >> (k + 1)) > 0
+            if not longer.any(): break
+            k += longer
+        lca = np.empty(len(l), np.int64)
+        for level in np.unique(k):
+            sel = k == level
+            row = np.frombuffer(self.table[level], np.int64)
+            lca[sel] = np.minimum(row[l[sel]], row[r[sel] - (1 << int(level)) + 1]) & 0xFFFFFFFF
+        return root_dist[a] + root_dist[b] - 2 * root_dist[lca]
+
 class CentroidDecomp:
-    def __init__(self, decomb):
-        self.decomb = decomb
+    """Centroid decomposition stored in CSR format: the centroids of the vertex v (from the top one)
+       and the distances from v to them are centroids[offsets[v]:offsets[v+1]] and dists[offsets[v]:offsets[v+1]].
+       The distances are 32-bit integers for unweighted trees, and 64-bit integers or floats for weighted ones."""
+    
+    def __init__(self, offsets, centroids, dists):
+        self.offsets = offsets      # n+1 64-bit integers
+        self.centroids = centroids  # 32-bit integers
+        self.dists = dists
+        self._marked = bytearray(len(self))
+        self._heaps = {}    # centroid -> heap of (distance, vertex) for (possibly no longer) marked vertices in its component
+        self._live = {}     # centroid -> number of marked vertices in its component
+        
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def _chain(self, v):
+        """Returns the range of indices of the centroids of v (and the distances to them)."""
+        return range(self.offsets[v], self.offsets[v+1])
+    
+    def mark(self, v):
+        """Marks the vertex v, in O(log^2 n) time."""
+        if self._marked[v]: return
+        self._marked[v] = 1
+        for i in self._chain(v):
+            c = self.centroids[i]
+            heappush(self._heaps.setdefault(c, []), (self.dists[i], v))
+            self._live[c] = self._live.get(c, 0) + 1
+            
+    def unmark(self, v):
+        """Unmarks the vertex v, in O(log n) (amortized) time. The entries of v are lazily removed from the heaps."""
+        if not self._marked[v]: return
+        self._marked[v] = 0
+        marked = self._marked
+        for i in self._chain(v):
+            c = self.centroids[i]
+            live = self._live[c] - 1
+            self._live[c] = live
+            heap = self._heaps[c]
+            if len(heap) > 2 * live + 16:   # too many stale entries, rebuild the heap
+                heap[:] = set(e for e in heap if marked[e[1]])
+                heapify(heap)
+    
+    def nearest_marked(self, v):
+        """Returns the pair (distance, vertex) for the marked vertex nearest to v, or None if no vertex is marked.
+           Takes O(log n) (amortized) time."""
+        marked, heaps = self._marked, self._heaps
+        result = None
+        for i in self._chain(v):
+            heap = heaps.get(self.centroids[i])
+            if not heap: continue
+            while heap and not marked[heap[0][1]]: heappop(heap)
+            if heap:
+                d, u = heap[0]
+                d += self.dists[i]
+                if result is None or d < result[0]: result = (d, u)
+        return result
        
     def dist(self, a, b):
         """Returns the shortest distance from a to b."""
-        for (c1, d1), (c2, d2) in zip(self.decomb[a], self.decomb[b]):
-            if c1 != c2: break # impossible in the first iteration
-            result = d1 + d2 # length of the route: a -> common centroid -> b
+        oa, ob = self.offsets[a], self.offsets[b]
+        centroids, dists = self.centroids, self.dists
+        for l in range(min(self.offsets[a+1] - oa, self.offsets[b+1] - ob)):
+            if centroids[oa+l] != centroids[ob+l]: break # impossible in the first iteration
+            result = dists[oa+l] + dists[ob+l] # length of the route: a -> common centroid -> b
+        return result
+    
+    def dist_many(self, a, b):
+        """Returns numpy array of the shortest distances from a[i] to b[i], for given arrays a and b of vertices."""
+        import numpy as np
+        offsets = np.frombuffer(self.offsets, np.int64)
+        centroids = np.frombuffer(self.centroids, np.int32)
+        dists = np.frombuffer(self.dists, memoryview(self.dists).format)
+        a = np.asarray(a, np.int64)
+        b = np.asarray(b, np.int64)
+        oa, ob = offsets[a], offsets[b]
+        common = np.minimum(offsets[a+1] - oa, offsets[b+1] - ob)  # number of levels to check
+        result = dists[oa] + dists[ob]
+        active = np.flatnonzero(common > 1)   # queries whose centroids at the current level may be common
+        l = 1
+        while len(active):
+            ia = oa[active] + l
+            ib = ob[active] + l
+            same = centroids[ia] == centroids[ib]
+            active = active[same]
+            result[active] = dists[ia[same]] + dists[ib[same]]
+            l += 1
+            active = active[common[active] > l]
         return result
+    
+    def save(self, path):
+        """Writes the decomposition to the file: the number of vertices and the length of centroids (8-byte integers),
+           typecode of dists (padded to 8 bytes), offsets (8-byte integers), centroids (4-byte integers) and dists."""
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<QQ8s', len(self), len(self.centroids), memoryview(self.dists).format.encode()))
+            for a in (self.offsets, self.centroids, self.dists): f.write(memoryview(a).cast('B'))
+        
+    @classmethod
+    def load(cls, path):
+        """Constructs the decomposition from the file, which is memory-mapped (and therefore shared by processes) instead of read."""
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        n, total, typecode = struct.unpack_from('<QQ8s', mm)
+        typecode = typecode.rstrip(b'\0').decode()
+        view = memoryview(mm)
+        begin = 24
+        end = begin + 8 * (n+1)
+        offsets = view[begin:end].cast('q')
+        centroids = view[end:end + 4*total].cast('i')
+        end += 4*total
+        dists = view[end:end + array(typecode).itemsize*total].cast(typecode)
+        result = cls(offsets, centroids, dists)
+        result._mmap = mm
+        return result
+
+
+def path_tree(n):
+    tree = Tree(n)
+    for v in range(1, n): tree.add_edge(v-1, v)
+    return tree
+
+def star_tree(n):
+    tree = Tree(n)
+    for v in range(1, n): tree.add_edge(0, v)
+    return tree
+
+def random_tree(n, max_weight=None):
+    """Returns random tree of n vertices, weighted with random integers in range [1, max_weight] if max_weight is given."""
+    from random import randint, randrange
+    tree = Tree(n)
+    for v in range(1, n): tree.add_edge(randrange(v), v, None if max_weight is None else randint(1, max_weight))
+    return tree
+
+def benchmark(n = 100000, queries = 100000):
+    """Compare the build time, memory and queries per second of CentroidDecomp and LCADist
+       for path, star and random trees of n vertices."""
+    from random import randrange
+    from time import perf_counter
+    import tracemalloc
+    for name, make_tree in (('path', path_tree), ('star', star_tree), ('random', random_tree), ('random weighted', lambda n: random_tree(n, 1000))):
+        tree = make_tree(n)
+        a = array('i', (randrange(n) for _ in range(queries)))
+        b = array('i', (randrange(n) for _ in range(queries)))
+        for engine, build in (('CentroidDecomp', Tree.centroid_decomp), ('LCADist', Tree.lca_dist)):
+            start = perf_counter()
+            d = build(tree)
+            build_time = perf_counter() - start
+            start = perf_counter()
+            for x, y in zip(a, b): d.dist(x, y)
+            query_time = perf_counter() - start
+            del d
+            tracemalloc.start()     # slows down the program, so the memory is measured separately
+            d = build(tree)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f'{name} tree of {n} vertices, {engine}: build {build_time:.3f} s, memory {memory / 2**20:.1f} MiB, {queries / query_time:.0f} queries/s', end='')
+            try:
+                d.dist_many(a[:1], b[:1])   # warm-up, e.g. import numpy
+                start = perf_counter()
+                d.dist_many(a, b)
+                print(f', {queries / (perf_counter()-start):.0f} batch queries/s')
+            except ImportError:
+                print()
 
 
 if __name__ == "__main__":	# demo program:
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark(*map(int, sys.argv[2:]))
+        sys.exit()
     tree = Tree(5)
     tree.add_edge(0, 1)
     tree.add_edge(1, 2)
@@ -85,4 +418,4 @@ if __name__ == "__main__":	# demo program:
     tree.add_edge(3, 4)
 
     d=tree.centroid_decomp()
-    print(d.dist(0, 4))
\ No newline at end of file
+    print(d.dist(0, 4))
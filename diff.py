@@ -2,7 +2,15 @@
 # Piotr Beling, 2024
 
 from enum import Enum
+from io import StringIO
+from bisect import bisect_left
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
 import argparse
+import hashlib
+import json
+import os
+import sys
 
 def glcs(P, lenA, lenB):
     '''Returns the generalized LCS (longest common subsequence) matrix
@@ -23,6 +31,95 @@ def lcs_for_sim_matrix(P):
     '''Returns the LCS (longest common subsequence) matrix for given similarity matrix.'''
     return glcs(lambda a, b: P[a][b], len(P), len(P[0]))
 
+def lcs_for_sim_matrix_numpy(P):
+    '''Returns the LCS (longest common subsequence) matrix for given similarity matrix
+       (a list of lists or a 2D array of non-negative integers) as a 2D numpy array.
+       The rows are calculated one by one, each with a few vectorized numpy operations.'''
+    import numpy as np
+    P = np.asarray(P)
+    lenA, lenB = P.shape
+    dtype = np.int32 if lenA == 0 or int(P.max(initial=0)) * min(lenA, lenB) <= np.iinfo(np.int32).max else np.int64
+    P = P.astype(dtype, copy=False)
+    t = np.zeros((lenA+1, lenB+1), dtype=dtype)
+    for a in range(lenA):
+        row = t[a+1]
+        # row[b+1] = max(t[a][b] + P[a][b], t[a][b+1], row[b]):
+        np.add(t[a, :-1], P[a], out=row[1:])
+        np.maximum(row[1:], t[a, 1:], out=row[1:])
+        np.maximum.accumulate(row, out=row)
+    return t
+
+def _glcs_next_row(P, a, prev, b0=0, first=0):
+    '''Returns the row a+1 of the generalized LCS matrix for a function P,
+       given its row a restricted to the columns b0, b0+1, ... and the value first of the row a+1 in the column b0.'''
+    cur = [first] * len(prev)
+    for i in range(len(prev)-1):
+        cur[i+1] = max(prev[i] + P(a, b0+i), prev[i+1], cur[i])
+    return cur
+
+def _hirschberg(P, top, left, a0, b0, changes, block_size):
+    '''Appends to changes (in reverse order) the differences found by walking back (just like diff does)
+       through the fragment of the generalized LCS matrix which begins in the row a0 and the column b0,
+       and whose top row and left column are given. The walk begins in the bottom-right cell of the fragment
+       and must reach the row a0 without leaving the fragment. Returns the column at which it reaches the row a0.'''
+    height, width = len(left) - 1, len(top) - 1
+    if height * (width+1) <= block_size or height == 1:
+        t = [top]
+        for i in range(height): t.append(_glcs_next_row(P, a0+i, t[-1], b0, left[i+1]))
+        a, b = height, width
+        while a > 0:
+            if t[a][b] == t[a-1][b]:
+                changes.append(Diffs.OnlyA)
+                a -= 1
+            elif b > 0 and t[a][b] == t[a][b-1]:
+                changes.append(Diffs.OnlyB)
+                b -= 1
+            else:
+                changes.append(Diffs.Common)
+                a -= 1
+                b -= 1
+        return b0 + b
+    mid = height // 2
+    row = top
+    for i in range(mid): row = _glcs_next_row(P, a0+i, row, b0, left[i+1])
+    middle = row
+    # for each cell below the row mid, find the column at which the walk from this cell reaches the row mid:
+    reach = list(range(width+1))
+    for i in range(mid, height):
+        cur = [left[i+1]] * (width+1)
+        cur_reach = [-1] * (width+1)    # -1 if the walk leaves the fragment
+        if cur[0] == row[0]: cur_reach[0] = reach[0]
+        for b in range(width):
+            v = cur[b+1] = max(row[b] + P(a0+i, b0+b), row[b+1], cur[b])
+            if v == row[b+1]: cur_reach[b+1] = reach[b+1]
+            elif v == cur[b]: cur_reach[b+1] = cur_reach[b]
+            else: cur_reach[b+1] = reach[b]
+        row, reach = cur, cur_reach
+    c = reach[width]
+    del row, reach
+    # the part of the walk below the row mid lies to the right of the column c, whose values are recalculated:
+    row = middle[:c+1]
+    column = [row[c]]
+    for i in range(mid, height):
+        row = _glcs_next_row(P, a0+i, row, b0, left[i+1])
+        column.append(row[c])
+    del row
+    _hirschberg(P, middle[c:], column, a0+mid, b0+c, changes, block_size)
+    del middle, column
+    return _hirschberg(P, top[:c+1], left[:mid+1], a0, b0, changes, block_size)
+
+def diff_linear_space(P, lenA, lenB, block_size=1<<16):
+    '''Returns the same list of differences as diff(glcs(P, lenA, lenB)),
+       but uses Hirschberg-like divide-and-conquer approach to keep in memory
+       only O(lenA + lenB * log(lenA)) values (plus at most block_size cells) of the generalized LCS matrix.
+       The walk of diff is traced through the middle row of each fragment, which splits the fragment
+       into the top-left and bottom-right parts, so P is called at most 3 * lenA * lenB times.'''
+    changes = []
+    b = _hirschberg(P, [0] * (lenB+1), [0] * (lenA+1), 0, 0, changes, block_size) if lenA > 0 else lenB
+    changes.extend(Diffs.OnlyB for _ in range(b))
+    changes.reverse()
+    return changes
+
 def lines_of(filename):
     '''Returns the contents of a file as a list of strings with its lines.'''
     with open(filename, encoding="utf-8") as f:
@@ -53,47 +150,221 @@ def diff(lcs):
     changes.reverse()
     return changes
 
-def print_files_diff(diffs, A, B):
-    '''Print differences for the given list of differences
-       and compared sequences which are the lists of strings.'''
+def unique_anchors(A, B):
+    '''Returns the longest list of pairs (a, b), increasing in both a and b, such that
+       A[a] == B[b] and this element occurs exactly once in both A and B (as in patience diff).'''
+    count = {}
+    for a, e in enumerate(A):
+        c = count.get(e)
+        count[e] = [1, a, None] if c is None else [2]
+    for b, e in enumerate(B):
+        c = count.get(e)
+        if c is None or c[0] > 1: continue
+        if c[2] is None: c[2] = b
+        else: c[0] = 2
+    pairs = sorted((c[1], c[2]) for c in count.values() if c[0] == 1 and c[2] is not None)
+    # patience sorting to find the longest increasing subsequence of pairs' b:
+    tops, tops_b, prev = [], [], [None] * len(pairs)
+    for i, (_, b) in enumerate(pairs):
+        pile = bisect_left(tops_b, b)
+        if pile > 0: prev[i] = tops[pile-1]
+        if pile == len(tops):
+            tops.append(i)
+            tops_b.append(b)
+        else:
+            tops[pile] = i
+            tops_b[pile] = b
+    result = []
+    i = tops[-1] if tops else None
+    while i is not None:
+        result.append(pairs[i])
+        i = prev[i]
+    result.reverse()
+    return result
+
+def anchored_diff(A, B, hunk_diff):
+    '''Returns a list of differences between A and B. Common prefix and suffix of A and B,
+       as well as the elements that are unique in both of them (see unique_anchors), are recognized
+       as common without calling hunk_diff(A_part, B_part), which is used to obtain the list of
+       differences between the remaining parts (hunks) of A and B.'''
+    changes = []
+    def _anchored_diff(a0, a1, b0, b1):
+        prefix_end = a0
+        while prefix_end < a1 and b0 < b1 and A[prefix_end] == B[b0]:
+            prefix_end += 1
+            b0 += 1
+        changes.extend(Diffs.Common for _ in range(prefix_end - a0))
+        a0 = prefix_end
+        suffix_len = 0
+        while a0 < a1 and b0 < b1 and A[a1-1] == B[b1-1]:
+            a1 -= 1
+            b1 -= 1
+            suffix_len += 1
+        if a0 == a1:
+            changes.extend(Diffs.OnlyB for _ in range(b1 - b0))
+        elif b0 == b1:
+            changes.extend(Diffs.OnlyA for _ in range(a1 - a0))
+        else:
+            anchors = unique_anchors(A[a0:a1], B[b0:b1])
+            if anchors:
+                prev_a, prev_b = a0, b0
+                for a, b in anchors:
+                    a += a0
+                    b += b0
+                    _anchored_diff(prev_a, a, prev_b, b)
+                    changes.append(Diffs.Common)
+                    prev_a, prev_b = a+1, b+1
+                _anchored_diff(prev_a, a1, prev_b, b1)
+            else:
+                changes.extend(hunk_diff(A[a0:a1], B[b0:b1]))
+        changes.extend(Diffs.Common for _ in range(suffix_len))
+    _anchored_diff(0, len(A), 0, len(B))
+    return changes
+
+def chars_diff(A: str, B: str):
+    '''Returns a list of pairs (kind, text), where kind is a member of Diffs,
+       that describe the differences between the strings A and B.'''
+    result = []
+    a, b = 0, 0
+    for d in diff(lcs(A, B)):
+        if d == Diffs.OnlyB:
+            c = B[b]
+            b += 1
+        else:
+            c = A[a]
+            a += 1
+            if d == Diffs.Common: b += 1
+        if result and result[-1][0] == d:
+            result[-1][1].append(c)
+        else:
+            result.append((d, [c]))
+    return [(d, ''.join(text)) for d, text in result]
+
+def print_files_diff(diffs, A, B, out=None, char_diff=False):
+    '''Print (to out, sys.stdout by default) differences for the given list of differences
+       and compared sequences which are the lists of strings.
+       Common but not equal elements are compared character by character if char_diff is True,
+       and printed as removed and added otherwise.'''
+    if out is None: out = sys.stdout
     a, b = 0, 0
     for d in diffs:
         if d == Diffs.OnlyA:
-            print("\033[31m", A[a], sep='')
+            out.write(f"\033[31m{A[a]}\n")
             a += 1
         elif d == Diffs.OnlyB:
-            print("\033[32m", B[b], sep='')
+            out.write(f"\033[32m{B[b]}\n")
             b += 1
         else:
             la, lb = A[a], B[b]
-            print("\033[0m", end='')
-            h = diff(lcs(la, lb))
-            print_lines_diff(h, la, lb)
-            print()
+            if la == lb:
+                out.write(f"\033[0m{la}\n")
+            elif char_diff:
+                out.write("\033[0m")
+                print_lines_diff(diff(lcs(la, lb)), la, lb, out)
+                out.write("\n")
+            else:
+                out.write(f"\033[31m{la}\n\033[32m{lb}\n")
             a += 1
             b += 1
             
-def print_lines_diff(diffs, A: str, B: str):
-    '''Print differences for the given list of differences
+def print_lines_diff(diffs, A: str, B: str, out=None):
+    '''Print (to out, sys.stdout by default) differences for the given list of differences
        and compared sequences which are the strings.'''
+    if out is None: out = sys.stdout
     a, b = 0, 0
     prev_d = None
     for d in diffs:
         if d == Diffs.OnlyA:
-            if d != prev_d: print("\033[31m", sep='', end='')
-            print(A[a], sep='', end='')
+            if d != prev_d: out.write("\033[31m")
+            out.write(A[a])
             a += 1
         elif d == Diffs.OnlyB:
-            if d != prev_d: print("\033[32m", sep='', end='')
-            print(B[b], sep='', end='')
+            if d != prev_d: out.write("\033[32m")
+            out.write(B[b])
             b += 1
         else:
-            if d != prev_d: print("\033[0m", sep='', end='')
-            print(A[a], sep='', end='')
+            if d != prev_d: out.write("\033[0m")
+            out.write(A[a])
             a += 1
             b += 1
         prev_d = d
-        
+
+def _unified_range(start, length):
+    if length == 1: return str(start+1)
+    if length == 0: return f'{start},0'
+    return f'{start+1},{length}'
+
+def write_unified_diff(out, diffs, A, B, name_a='a', name_b='b', context=3):
+    '''Write to out the differences (given as the list of differences) between
+       the lists of strings A and B, in the unified diff format with the given number of context lines.
+       Common but not equal elements are written as removed and added.'''
+    ops = []    # (tag, a, b), where a and b are the indices of A and B elements before the operation
+    a, b = 0, 0
+    for d in diffs:
+        if d == Diffs.OnlyA:
+            ops.append(('-', a, b))
+            a += 1
+        elif d == Diffs.OnlyB:
+            ops.append(('+', a, b))
+            b += 1
+        else:
+            if A[a] == B[b]:
+                ops.append((' ', a, b))
+            else:
+                ops.append(('-', a, b))
+                ops.append(('+', a+1, b))
+            a += 1
+            b += 1
+    changes = [i for i, (tag, _, _) in enumerate(ops) if tag != ' ']
+    if not changes: return
+    out.write(f'--- {name_a}\n+++ {name_b}\n')
+    c = 0
+    while c < len(changes):
+        begin = max(0, changes[c] - context)
+        while c+1 < len(changes) and changes[c+1] - changes[c] <= 2 * context: c += 1
+        end = min(len(ops), changes[c] + context + 1)
+        c += 1
+        hunk = ops[begin:end]
+        a_len = sum(tag != '+' for tag, _, _ in hunk)
+        b_len = sum(tag != '-' for tag, _, _ in hunk)
+        _, a, b = hunk[0]
+        out.write(f'@@ -{_unified_range(a, a_len)} +{_unified_range(b, b_len)} @@\n')
+        added = []  # the lines added are written after the lines removed
+        for tag, a, b in hunk:
+            if tag == '-':
+                out.write(f'-{A[a]}\n')
+            elif tag == '+':
+                added.append(B[b])
+            else:
+                for line in added: out.write(f'+{line}\n')
+                added.clear()
+                out.write(f' {A[a]}\n')
+        for line in added: out.write(f'+{line}\n')
+
+def write_json_diff(out, diffs, A, B, name_a='a', name_b='b', char_diff=False):
+    '''Write to out the differences (given as the list of differences) between
+       the lists of strings A and B, as a JSON object whose "edits" is a list of runs
+       of the same operations: "Common" (equal lines), "OnlyA", "OnlyB", or "Changed"
+       (common but not equal lines, compared character by character if char_diff is True).'''
+    edits = []
+    a, b = 0, 0
+    for d in diffs:
+        if d == Diffs.Common and A[a] != B[b]:
+            edit = {'op': 'Changed', 'a': a, 'b': b, 'line_a': A[a], 'line_b': B[b]}
+            if char_diff: edit['chars'] = [(kind.name, text) for kind, text in chars_diff(A[a], B[b])]
+            edits.append(edit)
+        elif edits and edits[-1]['op'] == d.name:
+            edits[-1]['count'] += 1
+            if d != Diffs.Common: edits[-1]['lines'].append(A[a] if d == Diffs.OnlyA else B[b])
+        else:
+            edit = {'op': d.name, 'a': a, 'b': b, 'count': 1}
+            if d != Diffs.Common: edit['lines'] = [A[a] if d == Diffs.OnlyA else B[b]]
+            edits.append(edit)
+        if d != Diffs.OnlyB: a += 1
+        if d != Diffs.OnlyA: b += 1
+    json.dump({'file1': name_a, 'file2': name_b, 'edits': edits}, out, ensure_ascii=False)
+    out.write('\n')
+
 def sim_accurate(A, B):
     """Returns similarity of A and B in range [0, 1000000],
        calculated from length of their LCS."""
@@ -112,22 +383,247 @@ def sim_fast(A, B):
         if A[-i] != B[-i]: break
         common += 1
     return common * 2000000 // (len(A)+len(B))
-         
 
-parser = argparse.ArgumentParser(description='Print out the differences between the two files.')
-parser.add_argument('-s', '--sim', choices=['accurate', 'fast'], default='accurate', metavar='f',
-                    help="similarity function to use, 'accurate' (default) or 'fast'")
-parser.add_argument("file1", help="name of the first file to compare")
-parser.add_argument("file2", help="name of the second file to compare")
-args = parser.parse_args()
+class CachedSim:
+    """Similarity function which remembers its results for pairs of elements
+       and counts cache hits and misses."""
+    
+    def __init__(self, sim):
+        self.sim = sim
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        
+    def __call__(self, A, B):
+        key = (A, B)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.sim(A, B)
+            self.cache[key] = result
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+    
+    def hit_rate(self):
+        """Returns the fraction of calls answered from the cache."""
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+_worker_sim = None
+
+def _init_sim_worker(sim):
+    global _worker_sim
+    _worker_sim = CachedSim(sim)
+
+def _sim_rows(A, B):
+    '''Returns the similarity matrix for A and B calculated by the worker process
+       and the numbers of cache hits and misses it caused.'''
+    hits, misses = _worker_sim.hits, _worker_sim.misses
+    rows = [[_worker_sim(a, b) for b in B] for a in A]
+    return rows, _worker_sim.hits - hits, _worker_sim.misses - misses
+
+def sim_pool(sim, jobs):
+    '''Returns the pool of jobs processes ready to calculate (using sim_matrix) similarities with sim,
+       which must be picklable (e.g. module-level function).'''
+    return ProcessPoolExecutor(jobs, initializer=_init_sim_worker, initargs=(sim,))
+
+def sim_matrix(A, B, sim, pool=None, jobs=1):
+    '''Returns the similarity matrix [[sim(a, b) for b in B] for a in A].
+       If pool (see sim_pool) of jobs processes is given, its blocks of rows are calculated in parallel
+       and hits and misses of the workers' caches are added to sim's counters if sim is CachedSim.'''
+    if pool is None or jobs <= 1 or len(A) * len(B) < 4096:
+        return [[sim(a, b) for b in B] for a in A]
+    block = -(-len(A) // (4 * jobs))
+    P = []
+    for rows, hits, misses in pool.map(_sim_rows, (A[i:i+block] for i in range(0, len(A), block)), (B for _ in range(0, len(A), block))):
+        P.extend(rows)
+        if isinstance(sim, CachedSim):
+            sim.hits += hits
+            sim.misses += misses
+    return P
+
+SIMS = {'accurate': sim_accurate, 'fast': sim_fast}
+ENGINES = {'python': lcs_for_sim_matrix, 'numpy': lcs_for_sim_matrix_numpy}
+FORMATS = ('color', 'unified', 'json')
+
+def _timed(timings, phase, f, *args):
+    '''Calls f(*args) and adds its execution time to timings[phase] if timings is not None.'''
+    if timings is None: return f(*args)
+    start = perf_counter()
+    result = f(*args)
+    timings[phase] = timings.get(phase, 0.0) + perf_counter() - start
+    return result
+
+def diff_lines(A, B, sim=sim_accurate, anchor=False, linear_space=False, engine=lcs_for_sim_matrix, pool=None, jobs=1, timings=None):
+    '''Returns the list of differences between the lists of strings A and B, compared by sim.
+       anchor turns on anchored_diff, linear_space turns on diff_linear_space,
+       engine finds LCS for similarity matrix calculated (see sim_matrix) in the pool of jobs processes (if given).
+       If timings dictionary is given, the execution times of the phases are added to it.'''
+    def hunk_diff(A, B):
+        if not A or not B: return [Diffs.OnlyA] * len(A) + [Diffs.OnlyB] * len(B)
+        if linear_space:
+            return _timed(timings, 'linear-space diff', diff_linear_space, lambda a, b: sim(A[a], B[b]), len(A), len(B))
+        P = _timed(timings, 'similarity matrix', sim_matrix, A, B, sim, pool, jobs)
+        return _timed(timings, 'diff', diff, _timed(timings, 'LCS matrix', engine, P))
+    if not anchor: return hunk_diff(A, B)
+    if timings is None: return anchored_diff(A, B, hunk_diff)
+    start, hunks_time = perf_counter(), sum(timings.values())
+    result = anchored_diff(A, B, hunk_diff)
+    hunks_time = sum(timings.values()) - hunks_time
+    timings['anchoring'] = timings.get('anchoring', 0.0) + perf_counter() - start - hunks_time
+    return result
+
+def write_diff(out, diffs, A, B, name_a='a', name_b='b', format='color', context=3, char_diff=False):
+    '''Write to out the differences between the lists of strings A and B in the given format (one of FORMATS).'''
+    if format == 'unified':
+        write_unified_diff(out, diffs, A, B, name_a, name_b, context)
+    elif format == 'json':
+        write_json_diff(out, diffs, A, B, name_a, name_b, char_diff)
+    else:
+        print_files_diff(diffs, A, B, out, char_diff)
+
+def diff_files(file1, file2, out, format='color', context=3, char_diff=False, **options):
+    '''Write to out the differences between the given text files in the given format,
+       found by diff_lines called with options. Returns the list of differences.'''
+    A = lines_of(file1)
+    B = lines_of(file2)
+    diffs = diff_lines(A, B, **options)
+    write_diff(out, diffs, A, B, file1, file2, format, context, char_diff)
+    return diffs
+
+def file_hash(filename):
+    '''Returns the SHA-256 digest of the contents of the file.'''
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while chunk := f.read(1 << 20): h.update(chunk)
+    return h.digest()
+
+def files_in(directory):
+    '''Returns the sorted list of paths (relative to directory) of all files in the directory tree.'''
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, _, names in os.walk(directory) for name in names)
+
+def _diff_files_to_str(file1, file2, format, context, char_diff, options):
+    '''Returns the output of diff_files for the given files (or the message about binary files).'''
+    out = StringIO()
+    if format == 'color': out.write(f'\033[0mdiff {file1} {file2}\n')
+    try:
+        sim = options.pop('sim', sim_accurate)
+        if not options.get('linear_space'): sim = CachedSim(sim)    # the cache would grow to the matrix size
+        diff_files(file1, file2, out, format, context, char_diff, sim=sim, **options)
+    except UnicodeDecodeError:
+        if format == 'json': return json.dumps({'file1': file1, 'file2': file2, 'binary': True}) + '\n'
+        return f'Binary files {file1} and {file2} differ\n'
+    return out.getvalue()
+
+def diff_dirs(dir1, dir2, out, jobs=1, format='color', context=3, char_diff=False, **options):
+    '''Write to out the differences between all files in the given directory trees.
+       The files of the same contents (SHA-256) are skipped, the rest are compared
+       (by diff_files called with options) in jobs worker processes.
+       Returns the dictionary with the numbers of: identical, different, only in dir1 and only in dir2 files.'''
+    files1, files2 = files_in(dir1), files_in(dir2)
+    set1, set2 = set(files1), set(files2)
+    stats = {'identical': 0, 'different': 0, 'only in dir1': 0, 'only in dir2': 0}
+    to_compare = []
+    for rel in files1:
+        if rel not in set2: continue
+        f1, f2 = os.path.join(dir1, rel), os.path.join(dir2, rel)
+        if os.path.getsize(f1) == os.path.getsize(f2) and file_hash(f1) == file_hash(f2):
+            stats['identical'] += 1
+        else:
+            to_compare.append((f1, f2))
+    tasks = ([f1 for f1, _ in to_compare], [f2 for _, f2 in to_compare],
+             [format] * len(to_compare), [context] * len(to_compare),
+             [char_diff] * len(to_compare), [dict(options) for _ in to_compare])
+    if jobs > 1 and len(to_compare) > 1:
+        with ProcessPoolExecutor(jobs) as executor:
+            for text in executor.map(_diff_files_to_str, *tasks, chunksize=max(1, len(to_compare) // (4 * jobs))):
+                out.write(text)
+    else:
+        for text in map(_diff_files_to_str, *tasks):
+            out.write(text)
+    stats['different'] = len(to_compare)
+    for key, directory, files, other in (('only in dir1', dir1, files1, set2), ('only in dir2', dir2, files2, set1)):
+        for rel in files:
+            if rel in other: continue
+            stats[key] += 1
+            if format == 'json':
+                out.write(json.dumps({'only_in': directory, 'file': rel}) + '\n')
+            else:
+                out.write(f'Only in {directory}: {rel}\n')
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Print out the differences between the two files or directory trees.')
+    parser.add_argument('-s', '--sim', choices=SIMS, default='accurate', metavar='f',
+                        help="similarity function to use, 'accurate' (default) or 'fast'")
+    parser.add_argument('-l', '--linear-space', action='store_true',
+                        help="use linear-space (Hirschberg) algorithm, which computes similarities on demand instead of storing their matrix")
+    parser.add_argument('-a', '--anchor', action='store_true',
+                        help="recognize common prefix, suffix and lines unique in both files (as in patience diff) before comparing the rest")
+    parser.add_argument('-e', '--engine', choices=ENGINES, default='python',
+                        help="implementation of the algorithm which finds LCS for similarity matrix, 'python' (default) or 'numpy'")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help="number of processes calculating the similarity matrix or comparing files of directories (default 1)")
+    parser.add_argument('--stats', action='store_true',
+                        help="print (to stderr) the timings of the phases and the hit rate of the similarity cache (not used with --linear-space)")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='color',
+                        help="output format, 'color' (default, uses ANSI escape codes), 'unified' or 'json'")
+    parser.add_argument('-U', '--context', type=int, default=3, metavar='N',
+                        help="number of context lines in unified format (default 3)")
+    parser.add_argument('-c', '--char-diff', action='store_true',
+                        help="compare similar lines character by character (in color and json formats)")
+    parser.add_argument('-b', '--benchmark', action='store_true',
+                        help="instead of printing the differences, compare the speed of the engines on the given files")
+    parser.add_argument("file1", help="name of the first file (or directory) to compare")
+    parser.add_argument("file2", help="name of the second file (or directory) to compare")
+    args = parser.parse_args()
+
+    sim = SIMS[args.sim]
+    options = dict(anchor=args.anchor, linear_space=args.linear_space, engine=ENGINES[args.engine])
+
+    if os.path.isdir(args.file1) and os.path.isdir(args.file2):
+        start = perf_counter()
+        with open(sys.stdout.fileno(), 'w', encoding='utf-8', buffering=1<<16, closefd=False) as out:
+            stats = diff_dirs(args.file1, args.file2, out, args.jobs, args.format, args.context, args.char_diff, sim=sim, **options)
+        if args.stats:
+            print(', '.join(f'{key}: {count}' for key, count in stats.items()), file=sys.stderr)
+            print(f'total: {perf_counter()-start:.3f} s', file=sys.stderr)
+        return
+
+    timings = {}
+    A = _timed(timings, 'reading', lines_of, args.file1)
+    B = _timed(timings, 'reading', lines_of, args.file2)
+    pool = sim_pool(sim, args.jobs) if args.jobs > 1 and not args.linear_space else None
+    # linear-space diff does not cache, as the cache of all pairs of lines is as large as the matrix:
+    cached_sim = sim if args.linear_space and not args.benchmark else CachedSim(sim)
 
-A = lines_of(args.file1)
-B = lines_of(args.file2)
+    if args.benchmark:
+        P = _timed(timings, 'similarity matrix', sim_matrix, A, B, cached_sim, pool, args.jobs)
+        print(f'similarity matrix {len(A)}x{len(B)}: {timings["similarity matrix"]:.3f} s')
+        diffs = None
+        for name, engine in ENGINES.items():
+            engine([[0]])  # warm-up, e.g. import numpy
+            start = perf_counter()
+            t = engine(P)
+            lcs_time = perf_counter() - start
+            start = perf_counter()
+            d = diff(t)
+            print(f'{name}: LCS matrix {lcs_time:.3f} s, diff {perf_counter()-start:.3f} s')
+            if diffs is None: diffs = d
+            elif d != diffs: print(f'{name}: the differences found are not the same as found by the previous engine!')
+    else:
+        diffs = diff_lines(A, B, cached_sim, pool=pool, jobs=args.jobs, timings=timings, **options)
+        with open(sys.stdout.fileno(), 'w', encoding='utf-8', buffering=1<<16, closefd=False) as out:
+            _timed(timings, 'printing', write_diff, out, diffs, A, B, args.file1, args.file2, args.format, args.context, args.char_diff)
+    if pool is not None: pool.shutdown()
 
-if args.sim == 'fast':
-    sim = sim_fast
-else:
-    sim = sim_accurate
+    if args.stats:
+        for phase, t in timings.items():
+            print(f'{phase}: {t:.3f} s', file=sys.stderr)
+        if isinstance(cached_sim, CachedSim):
+            print(f'similarity cache: {cached_sim.hits} hits, {cached_sim.misses} misses, hit rate {cached_sim.hit_rate():.1%}', file=sys.stderr)
 
-P = [[sim(a, b) for b in B] for a in A]
-print_files_diff(diff(lcs_for_sim_matrix(P)), A, B)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
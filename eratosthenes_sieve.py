@@ -1,6 +1,15 @@
 #!/usr/bin/env python3
 # Piotr Beling, 2019
 
+from array import array
+from bisect import bisect_right
+from itertools import compress, takewhile
+from math import gcd, isqrt
+import mmap
+import os
+import struct
+import sys
+
 def primes():
     """Generate prime numbers ad infinitum using Sieve of Eratosthenes algorithm."""
     p = {}
@@ -22,6 +31,260 @@ def primes():
                 dest.append(v)
         n += 1
 
+def simple_sieve(n):
+    """Return the list of primes smaller than n, found by (not segmented) Sieve of Eratosthenes."""
+    if n < 3: return []
+    s = bytearray(b'\x01') * n
+    s[0] = s[1] = 0
+    for p in range(2, isqrt(n-1)+1):
+        if s[p]: s[p*p::p] = bytes((n - 1 - p*p) // p + 1)
+    return list(compress(range(n), s))
+
+def _wheel_primes(wheel):
+    if wheel not in (2, 6, 30): raise ValueError('wheel must be 2, 6 or 30')
+    return [p for p in (2, 3, 5) if wheel % p == 0]
+
+def _wheel_segments(segment_size, wheel):
+    """Generate ad infinitum triples (low, offsets, segment) such that the primes (not dividing wheel)
+    in the consecutive segment are low+offsets[i] for each i with non-zero segment[i]."""
+    wheel_primes = _wheel_primes(wheel)
+    residues = [r for r in range(1, wheel) if gcd(r, wheel) == 1]
+    turns = max(1, segment_size // len(residues))  # number of wheel turns per segment
+    size = turns * len(residues)
+    offsets = array('L', (wheel*k + r for k in range(turns) for r in residues))
+    base = []   # sieving primes, each with the list of m (mod wheel) such that p*m is in the class of the given residue
+    def add_base(p):
+        inv = pow(p, -1, wheel)
+        base.append((p, [r * inv % wheel for r in residues]))
+    first_limit = isqrt(wheel * turns) + 1   # the primes up to first_limit are enough for the first segment
+    for p in simple_sieve(first_limit + 1):
+        if p not in wheel_primes: add_base(p)
+    more_base = (p for p in primes_segmented(segment_size, wheel) if p > first_limit)   # started only if needed
+    pending = None  # next sieving prime, not yet in base
+    low = 0
+    while True:
+        high = low + wheel * turns
+        if pending is None and isqrt(high-1) > first_limit: pending = next(more_base)
+        while pending is not None and pending * pending < high:
+            add_base(pending)
+            pending = next(more_base)
+        seg = bytearray(b'\x01') * size
+        if low == 0: seg[0] = 0     # 1 is not a prime
+        first_turn = low // wheel
+        for p, ms in base:
+            m_min = max(p, -(-low // p))
+            step = len(residues) * p
+            for j, m in enumerate(ms):
+                m = m_min + (m - m_min) % wheel     # p*m is the first multiple of p to cross off in the j-th class
+                start = (p * m // wheel - first_turn) * len(residues) + j
+                if start < size: seg[start::step] = bytes((size - 1 - start) // step + 1)
+        yield low, offsets, seg
+        low = high
+
+def primes_segmented(segment_size=1<<18, wheel=30):
+    """Generate prime numbers ad infinitum using segmented Sieve of Eratosthenes algorithm.
+    Each segment is a bytearray of (about) segment_size flags of the numbers coprime to wheel (2, 6 or 30),
+    so the memory usage is bounded by segment_size plus the primes up to the square root of the largest number generated."""
+    yield from _wheel_primes(wheel)
+    for low, offsets, seg in _wheel_segments(segment_size, wheel):
+        yield from map(low.__add__, compress(offsets, seg))
+
+def prime_chunks(chunk_size, segment_size=1<<18, wheel=30):
+    """Generate ad infinitum array('Q') chunks of chunk_size consecutive prime numbers, found like by primes_segmented.
+    The chunks support the buffer protocol, so they can be viewed without copying, e.g. by numpy.frombuffer(chunk, numpy.uint64)."""
+    if chunk_size < 1: raise ValueError('chunk_size must be positive')
+    chunk = array('Q', _wheel_primes(wheel))
+    for low, offsets, seg in _wheel_segments(segment_size, wheel):
+        chunk.extend(map(low.__add__, compress(offsets, seg)))
+        if len(chunk) < chunk_size: continue
+        end = len(chunk) - len(chunk) % chunk_size
+        for i in range(0, end, chunk_size): yield chunk[i:i+chunk_size]
+        del chunk[:end]
+
+class _UInt32Table:
+    """Table (array or memory-mapped file) of 4-byte unsigned integers calculated for the numbers up to limit (smaller than 2**32).
+    The file consists of the limit (8-byte unsigned integer) followed by the values (4-byte unsigned integers),
+    all little-endian."""
+    
+    def __init__(self, limit, values):
+        self.limit = limit
+        self.values = values
+        
+    @classmethod
+    def _check_limit(cls, limit):
+        if limit >= 1 << 32: raise ValueError(f'{cls.__name__} limit must be smaller than 2**32')
+    
+    def save(self, path):
+        """Write the table to the file (atomically, by renaming a temporary file)."""
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack('<Q', self.limit))
+            values = array('I', self.values)
+            if sys.byteorder == 'big': values.byteswap()
+            f.write(values.tobytes())
+        os.replace(tmp_path, path)
+        
+    @classmethod
+    def load(cls, path):
+        """Construct the table from the file, which is memory-mapped (and therefore shared by processes) instead of read.
+        On big-endian machines the values are copied instead. Raise ValueError if the file does not hold a valid table."""
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # raises ValueError for an empty file
+        if len(mm) < 8 or (len(mm) - 8) % 4 != 0:
+            mm.close()
+            raise ValueError(f'{path} does not hold a valid {cls.__name__}')
+        limit, = struct.unpack_from('<Q', mm)
+        if sys.byteorder == 'big':
+            values = array('I', mm[8:])
+            values.byteswap()
+            mm.close()
+            return cls(limit, values)
+        result = cls(limit, memoryview(mm)[8:].cast('I'))
+        result._mmap = mm
+        return result
+    
+    @classmethod
+    def open(cls, path, limit):
+        """Load the table from the file if it is calculated for the numbers up to limit.
+        Otherwise (also if the file is missing or invalid) build the table, save it to the file and load it back."""
+        try:
+            result = cls.load(path)
+            if result.limit >= limit: return result
+        except (FileNotFoundError, ValueError):
+            pass
+        cls.build(limit).save(path)
+        return cls.load(path)
+
+class PrimeTable(_UInt32Table):
+    """Sorted table (array or memory-mapped file) of all primes up to limit (smaller than 2**32)."""
+    
+    @classmethod
+    def build(cls, limit):
+        """Construct the table of primes up to limit using primes_segmented."""
+        cls._check_limit(limit)
+        return cls(limit, array('I', takewhile(lambda p: p <= limit, primes_segmented())))
+    
+    @property
+    def primes(self):
+        return self.values
+    
+    def count(self, x):
+        """Return the number of primes not greater than x (which must not be greater than limit)."""
+        return bisect_right(self.primes, x)
+    
+    def __contains__(self, n):
+        i = bisect_right(self.primes, n)
+        return i > 0 and self.primes[i-1] == n
+    
+class SmallestPrimeFactors(_UInt32Table):
+    """Table (array or memory-mapped file) of the smallest prime factors of the odd numbers up to limit (smaller than 2**32),
+    that allows to factorize any number up to limit in O(log n) time.
+    The i-th value is the smallest prime factor of 2*i+1, or 0 if 2*i+1 is a prime (or 1)."""
+    
+    @classmethod
+    def build(cls, limit):
+        """Construct the table for the numbers up to limit. Starting from the largest sieving prime p (obtained by simple_sieve),
+        the odd multiples of p (from p*p) are assigned p, so each number finally gets its smallest prime factor."""
+        cls._check_limit(limit)
+        spf = array('I', bytes(4 * (limit // 2 + 1)))
+        for p in reversed(simple_sieve(isqrt(limit) + 1)[1:]):
+            start = p * p // 2
+            spf[start::p] = array('I', (p,)) * ((len(spf) - 1 - start) // p + 1)
+        return cls(limit, spf)
+    
+    def factorize(self, n):
+        """Return the list of prime factors (in non-decreasing order, with repetitions) of n, 1 <= n <= limit."""
+        if not 1 <= n <= self.limit: raise ValueError(f'number {n} out of the factorization range [1, {self.limit}]')
+        twos = (n & -n).bit_length() - 1
+        result = [2] * twos
+        n >>= twos
+        spf = self.values
+        while n > 1:
+            p = spf[n >> 1]
+            if p == 0:
+                result.append(n)
+                break
+            result.append(p)
+            n //= p
+        return result
+    
+    def factorize_many(self, numbers):
+        """Return the list of the results of factorize for each number in the given iterable."""
+        factorize = self.factorize
+        return [factorize(n) for n in numbers]
+
+_default_table = PrimeTable(1, array('I'))
+
+def _table_up_to(limit, table=None):
+    """Return table if it includes primes up to limit, otherwise the default table, extended if needed."""
+    global _default_table
+    if table is not None and table.limit >= limit: return table
+    if _default_table.limit < limit:
+        _default_table = PrimeTable.build(max(limit, 2 * _default_table.limit, 1 << 16))
+    return _default_table
+
+def _sieve_window(lo, hi, table=None, segment_size=1<<20):
+    """Generate pairs (n, segment) such that the i-th flag of bytearray segment tells whether n+2*i is a prime,
+    that cover all odd numbers in the range [lo, hi)."""
+    lo = max(lo, 1) | 1
+    if lo >= hi: return
+    base = _table_up_to(isqrt(hi-1), table).primes
+    base_end = bisect_right(base, isqrt(hi-1))
+    while lo < hi:
+        size = min(segment_size, (hi - lo + 1) // 2)
+        seg_hi = lo + 2 * size
+        seg = bytearray(b'\x01') * size
+        if lo == 1: seg[0] = 0  # 1 is not a prime
+        for i in range(1, base_end):
+            p = base[i]
+            m = max(p * p, -(-lo // p) * p)
+            if m % 2 == 0: m += p
+            if m >= seg_hi:
+                if p * p >= seg_hi: break
+                continue
+            start = (m - lo) // 2
+            seg[start::p] = bytes((size - 1 - start) // p + 1)
+        yield lo, seg
+        lo = seg_hi
+
+def primes_between(lo, hi, table=None):
+    """Generate (in increasing order) all primes in the range [lo, hi) using segmented Sieve of Eratosthenes algorithm,
+    with the sieving primes taken from the given PrimeTable (if it is large enough)."""
+    if lo <= 2 < hi: yield 2
+    for n, seg in _sieve_window(lo, hi, table):
+        yield from compress(range(n, n + 2 * len(seg), 2), seg)
+
+def prime_count(x, table=None):
+    """Return the number of primes not greater than x, using the given PrimeTable (if it is large enough)."""
+    if x < 2: return 0
+    if table is not None and x <= table.limit: return table.count(x)
+    table = _table_up_to(isqrt(x), table)
+    if x <= table.limit: return table.count(x)
+    return table.count(table.limit) + sum(seg.count(1) for _, seg in _sieve_window(table.limit + 1, x + 1, table))
+
+_MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)  # deterministic for n < 3317044064679887385961981
+
+def is_prime(n, table=None):
+    """Return whether n is a prime. Use the given PrimeTable if it includes n, and Miller-Rabin test otherwise.
+    The test is deterministic for n < 3317044064679887385961981 (and probabilistic for larger n)."""
+    if table is not None and n <= table.limit: return n in table
+    if n < 2: return False
+    for p in _MILLER_RABIN_BASES:
+        if n % p == 0: return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in _MILLER_RABIN_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1: continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1: break
+        else:
+            return False
+    return True
+
 if __name__ == "__main__": # demo program:
     from itertools import takewhile
     for prime in takewhile(lambda x: x < 100, primes()):
@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 # Piotr Beling, 2018
 
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from time import perf_counter
+
 class FindUnionTree:
     """Tree implementation of find-union set. See:
     'Introduction to Algorithms' by Thomas H. Cormen, Charles E. Leiserson, Ronald L. Rivest and Clifford Stein"""
@@ -9,6 +15,8 @@ class FindUnionTree:
         """Construct one-element tree."""
         self.parent = None  # parent is None only for the root
         self.h = 0
+        self.size = 1   # number of elements in the set, like h, kept only by the root
+        self.next = self    # next element of the same set, in the circular list of all elements of the set
         
     #@property
     #def root(self) -> 'FindUnionTree':
@@ -34,23 +42,388 @@ class FindUnionTree:
         """Return whether self and other are in the same tree (set). Compress the paths from self and other to their roots."""
         return self.root is other.root
     
+    @property
+    def set_size(self) -> int:
+        """Return the number of elements in the set which includes self. Compress the path from self to its root."""
+        return self.root.size
+    
+    def members(self):
+        """Generate all elements of the set which includes self (starting from self), in O(1) time per element."""
+        node = self
+        while True:
+            yield node
+            node = node.next
+            if node is self: return
+    
     def union(self, other: 'FindUnionTree') -> None:
         """Merge the sets which includes self and other by joining the root of the shorter tree to the root of the taller tree.
         Compress the paths from self and other to their roots."""
         self_root = self.root
         other_root = other.root
         if self_root is other_root: return
+        self_root.next, other_root.next = other_root.next, self_root.next   # merge circular lists
         if self_root.h >= other_root.h:
             other_root.parent = self_root
             if self_root.h == other_root.h:
                 self_root.h += 1
-            del other_root.h
+            self_root.size += other_root.size
+            del other_root.h, other_root.size
         else:
             self_root.parent = other_root
-            del self_root.h
+            other_root.size += self_root.size
+            del self_root.h, self_root.size
+
+
+class DisjointSet:
+    """Array implementation of find-union set of integers 0, 1, ..., size-1.
+    Like FindUnionTree, it uses union by rank and path compression, tracks the sizes of the sets
+    and links the elements of each set in a circular list, but stores all of these in flat arrays
+    instead of one object per element."""
+    
+    def __init__(self, size: int):
+        """Construct size one-element sets."""
+        self.parent = array('i', range(size))   # parent[x] == x only for the root
+        self.rank = array('B', bytes(size))     # ranks do not exceed log2(size)
+        self.size = array('i', [1]) * size      # size[x] is the number of elements in the set, valid only for the root x
+        self.next = array('i', range(size))     # next element of the same set, in the circular list of all elements of the set
+        self.components = size  # number of sets
+        
+    def __len__(self) -> int:
+        return len(self.parent)
+        
+    def root(self, x: int) -> int:
+        """Return the root of x and compress the path from x to its root."""
+        parent = self.parent
+        result = x
+        while parent[result] != result: result = parent[result]
+        while parent[x] != result:  # path compression
+            parent[x], x = result, parent[x]
+        return result
+    
+    def in_same_set(self, a: int, b: int) -> bool:
+        """Return whether a and b are in the same set. Compress the paths from a and b to their roots."""
+        return self.root(a) == self.root(b)
+    
+    def set_size(self, x: int) -> int:
+        """Return the number of elements in the set which includes x. Compress the path from x to its root."""
+        return self.size[self.root(x)]
+    
+    def members(self, x: int):
+        """Generate all elements of the set which includes x (starting from x), in O(1) time per element."""
+        next = self.next
+        y = x
+        while True:
+            yield y
+            y = next[y]
+            if y == x: return
+    
+    def union(self, a: int, b: int) -> None:
+        """Merge the sets which include a and b by joining the root of the lower rank to the root of the higher rank.
+        Compress the paths from a and b to their roots."""
+        a = self.root(a)
+        b = self.root(b)
+        if a == b: return
+        next = self.next
+        next[a], next[b] = next[b], next[a]     # merge circular lists
+        rank = self.rank
+        if rank[a] >= rank[b]:
+            self.parent[b] = a
+            if rank[a] == rank[b]: rank[a] += 1
+            self.size[a] += self.size[b]
+        else:
+            self.parent[a] = b
+            self.size[b] += self.size[a]
+        self.components -= 1
+            
+    def extend(self, count: int) -> None:
+        """Add count one-element sets with the next integers."""
+        size = len(self.parent)
+        self.parent.extend(range(size, size + count))
+        self.rank.extend(bytes(count))
+        self.size.extend(array('i', [1]) * count)
+        self.next.extend(range(size, size + count))
+        self.components += count
+        
+    def component_ids(self) -> array:
+        """Return the array whose x-th element is the id (0, 1, ..., components-1) of the set including x.
+        Compress all paths."""
+        ids = array('i', [-1]) * len(self.parent)
+        next_id = 0
+        for x in range(len(self.parent)):
+            r = self.root(x)
+            if ids[r] < 0:
+                ids[r] = next_id
+                next_id += 1
+            ids[x] = ids[r]
+        return ids
+            
+    def union_edges(self, src, dst) -> None:
+        """Merge the sets which include src[i] and dst[i] for each i, for the given sequences (e.g. int arrays) src and dst."""
+        parent, rank, size, next = self.parent, self.rank, self.size, self.next
+        for a, b in zip(src, dst):
+            ra = a
+            while parent[ra] != ra: ra = parent[ra]
+            while parent[a] != ra: parent[a], a = ra, parent[a]
+            rb = b
+            while parent[rb] != rb: rb = parent[rb]
+            while parent[b] != rb: parent[b], b = rb, parent[b]
+            if ra == rb: continue
+            next[ra], next[rb] = next[rb], next[ra]
+            if rank[ra] >= rank[rb]:
+                parent[rb] = ra
+                if rank[ra] == rank[rb]: rank[ra] += 1
+                size[ra] += size[rb]
+            else:
+                parent[ra] = rb
+                size[rb] += size[ra]
+            self.components -= 1
+
+
+class RollbackDisjointSet:
+    """Array implementation of find-union set of integers 0, 1, ..., size-1 whose unions can be undone.
+    It uses union by rank without path compression, so root costs O(log size),
+    and it records each union on the stack, so rollback costs O(number of unions undone)."""
+    
+    def __init__(self, size: int):
+        """Construct size one-element sets."""
+        self.parent = array('i', range(size))   # parent[x] == x only for the root
+        self.rank = array('B', bytes(size))
+        self.components = size  # number of sets
+        self._history = []  # (joined root, whether the rank of its new parent was increased) for each union
+        
+    def __len__(self) -> int:
+        return len(self.parent)
+    
+    def root(self, x: int) -> int:
+        """Return the root of x."""
+        parent = self.parent
+        while parent[x] != x: x = parent[x]
+        return x
+    
+    def in_same_set(self, a: int, b: int) -> bool:
+        """Return whether a and b are in the same set."""
+        return self.root(a) == self.root(b)
+    
+    def union(self, a: int, b: int) -> bool:
+        """Merge the sets which include a and b by joining the root of the lower rank to the root of the higher rank.
+        Return whether the sets were different (and therefore merged)."""
+        a = self.root(a)
+        b = self.root(b)
+        if a == b: return False
+        rank = self.rank
+        if rank[a] < rank[b]: a, b = b, a
+        self.parent[b] = a
+        increased = rank[a] == rank[b]
+        if increased: rank[a] += 1
+        self._history.append((b, increased))
+        self.components -= 1
+        return True
+    
+    def snapshot(self) -> int:
+        """Return the token which allows to rollback to the current state."""
+        return len(self._history)
+    
+    def rollback(self, token: int) -> None:
+        """Undo all unions made after the snapshot that returned the given token."""
+        parent, rank, history = self.parent, self.rank, self._history
+        while len(history) > token:
+            b, increased = history.pop()
+            a = parent[b]
+            parent[b] = b
+            if increased: rank[a] -= 1
+            self.components += 1
+
+
+def offline_connectivity(size: int, operations) -> list:
+    """Process the operations on the undirected graph of size vertices, without edges at the beginning.
+    Each operation is a triple: ('+', a, b) - add edge a-b, ('-', a, b) - remove edge a-b (that must exist),
+    ('?', a, b) - query whether a and b are connected. Return the list of query answers.
+    Each edge is added to the nodes of the segment tree over time that cover its lifetime,
+    and the tree is traversed with RollbackDisjointSet, in O(m log m log size) time for m operations."""
+    operations = list(operations)
+    m = len(operations)
+    if m == 0: return []
+    n = 1
+    while n < m: n *= 2
+    edges = [[] for _ in range(2 * n)]  # edges[node] - edges alive during the whole time range of the node
+    def add_edge(l, r, edge):   # add edge to the nodes covering the time range [l, r)
+        l += n
+        r += n
+        while l < r:
+            if l & 1:
+                edges[l].append(edge)
+                l += 1
+            if r & 1:
+                r -= 1
+                edges[r].append(edge)
+            l //= 2
+            r //= 2
+    added = {}  # edge -> list of its insertion times
+    for t, (op, a, b) in enumerate(operations):
+        edge = (a, b) if a <= b else (b, a)
+        if op == '+':
+            added.setdefault(edge, []).append(t)
+        elif op == '-':
+            times = added[edge]
+            add_edge(times.pop(), t, edge)
+            if not times: del added[edge]
+    for edge, times in added.items():
+        for t in times: add_edge(t, m, edge)
+    dsu = RollbackDisjointSet(size)
+    answers = []
+    stack = [(1, None)]     # (node, None) - enter the node, (node, token) - leave the node
+    while stack:
+        node, token = stack.pop()
+        if token is not None:
+            dsu.rollback(token)
+            continue
+        stack.append((node, dsu.snapshot()))
+        for a, b in edges[node]: dsu.union(a, b)
+        if node >= n:
+            t = node - n
+            if t < m and operations[t][0] == '?':
+                answers.append(dsu.in_same_set(operations[t][1], operations[t][2]))
+        else:
+            stack.append((2 * node + 1, None))
+            stack.append((2 * node, None))
+    return answers
+
+
+def _kruskal_sorted(dsu: DisjointSet, edges, forest: list) -> None:
+    """Append to forest the edges (weight, a, b) from the sorted iterable that join different sets of dsu, and union these sets."""
+    for edge in edges:
+        if dsu.components == 1: return
+        _, a, b = edge
+        if dsu.root(a) != dsu.root(b):
+            dsu.union(a, b)
+            forest.append(edge)
+
+def kruskal(vertex_count: int, edges, presorted: bool = False, chunk_size: int = 1 << 20) -> list:
+    """Return the list of edges of a minimum spanning forest of the graph with vertex_count vertices and the given edges,
+    which is an iterable (possibly a stream) of triples (weight, a, b).
+    If the edges are presorted by weight, they are consumed one by one (only until the forest becomes a tree).
+    Otherwise, they are processed in sorted chunks of chunk_size edges, each together with the forest found so far,
+    as the minimum spanning forest of the forest and the next chunk is the minimum spanning forest of all edges seen."""
+    if presorted:
+        forest = []
+        _kruskal_sorted(DisjointSet(vertex_count), edges, forest)
+        return forest
+    forest = []
+    edges = iter(edges)
+    while True:
+        chunk = [edge for _, edge in zip(range(chunk_size), edges)]
+        if not chunk: return forest
+        chunk.extend(forest)
+        chunk.sort()
+        forest = []
+        _kruskal_sorted(DisjointSet(vertex_count), chunk, forest)
+
+def _spanning_forest(lines: list) -> tuple:
+    """Return the edges (as two arrays, src and dst) of a spanning forest of the edges
+    given by the lines "a b" (lines starting with # are ignored) and the number of these edges."""
+    tokens = b''.join(line for line in lines if not line.startswith(b'#')).split()
+    local = {}  # global vertex -> local vertex
+    src, dst = array('i'), array('i')
+    dsu = DisjointSet(0)
+    for i in range(0, len(tokens) - 1, 2):
+        a, b = int(tokens[i]), int(tokens[i+1])
+        la = local.get(a)
+        if la is None:
+            la = local[a] = len(local)
+            dsu.extend(1)
+        lb = local.get(b)
+        if lb is None:
+            lb = local[b] = len(local)
+            dsu.extend(1)
+        ra, rb = dsu.root(la), dsu.root(lb)
+        if ra != rb:
+            dsu.union(ra, rb)
+            src.append(a)
+            dst.append(b)
+    return src, dst, len(tokens) // 2
+
+def connected_components(filename: str, vertex_count: int = 0, jobs: int = 1, chunk_bytes: int = 1 << 22) -> tuple:
+    """Find the connected components of the graph whose edges are the lines "a b" (a, b - non-negative integers) of the file.
+    The file is streamed in chunks of about chunk_bytes, each reduced to its spanning forest in one of jobs worker processes.
+    The forests are merged into a global DisjointSet, which is extended when a vertex larger than vertex_count-1 is found.
+    Return the array of component ids of the vertices (see DisjointSet.component_ids)
+    and the statistics: the number of edges, forest edges, and the times of the stages."""
+    stats = {'edges': 0, 'forest edges': 0, 'reading time': 0.0, 'reduction time': 0.0, 'merging time': 0.0, 'labeling time': 0.0}
+    dsu = DisjointSet(vertex_count)
+    def merge(src, dst, edges):
+        start = perf_counter()
+        stats['edges'] += edges
+        stats['forest edges'] += len(src)
+        if src:
+            needed = max(max(src), max(dst)) + 1
+            if needed > len(dsu): dsu.extend(needed - len(dsu))
+            dsu.union_edges(src, dst)
+        stats['merging time'] += perf_counter() - start
+    start = perf_counter()
+    with open(filename, 'rb') as f, (ProcessPoolExecutor(jobs) if jobs > 1 else nullcontext()) as pool:
+        pending = deque()   # futures of the chunks processed by the workers
+        while True:
+            read_start = perf_counter()
+            lines = f.readlines(chunk_bytes)
+            stats['reading time'] += perf_counter() - read_start
+            if not lines: break
+            if pool is None:
+                reduce_start = perf_counter()
+                forest = _spanning_forest(lines)
+                stats['reduction time'] += perf_counter() - reduce_start
+                merge(*forest)
+                continue
+            pending.append(pool.submit(_spanning_forest, lines))
+            if len(pending) >= 2 * jobs: merge(*pending.popleft().result())
+        while pending: merge(*pending.popleft().result())
+    if pool is not None:    # workers run in parallel with the other stages, so their time is what is left
+        stats['reduction time'] = perf_counter() - start - stats['reading time'] - stats['merging time']
+    labeling_start = perf_counter()
+    ids = dsu.component_ids()
+    stats['labeling time'] = perf_counter() - labeling_start
+    return ids, stats
+
+
+def benchmark(size = 1000000, edges = 1000000):
+    """Compare the time and memory of the FindUnionTree and DisjointSet unions of random edges."""
+    from random import randrange
+    import tracemalloc
+    src = array('i', (randrange(size) for _ in range(edges)))
+    dst = array('i', (randrange(size) for _ in range(edges)))
+    def measure(name, construct, unite):
+        start = perf_counter()
+        structure = construct()
+        built = perf_counter()
+        unite(structure)
+        end = perf_counter()
+        del structure
+        tracemalloc.start()     # slows down the program, so the memory is measured separately
+        structure = construct()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f'{name}: construction {built-start:.3f} s, {edges} unions {end-built:.3f} s, memory {memory / 2**20:.1f} MiB')
+    def unite_trees(tab):
+        for a, b in zip(src, dst): tab[a].union(tab[b])
+    measure('FindUnionTree', lambda: [FindUnionTree() for _ in range(size)], unite_trees)
+    measure('DisjointSet.union', lambda: DisjointSet(size), lambda s: [s.union(a, b) for a, b in zip(src, dst)])
+    measure('DisjointSet.union_edges', lambda: DisjointSet(size), lambda s: s.union_edges(src, dst))
 
 
 if __name__ == "__main__":	# demo program:
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark(*map(int, sys.argv[2:]))
+        sys.exit()
+    if len(sys.argv) > 2 and sys.argv[1] == 'components':   # components EDGE_FILE [JOBS [IDS_OUTPUT_FILE]]
+        ids, stats = connected_components(sys.argv[2], jobs=int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+        print(f"{len(ids)} vertices, {max(ids, default=-1)+1} components")
+        for stage, count in (('reading', 'edges'), ('reduction', 'edges'), ('merging', 'forest edges'), ('labeling', None)):
+            t = stats[f'{stage} time']
+            items = len(ids) if count is None else stats[count]
+            print(f"{stage}: {t:.3f} s, {items / t if t > 0 else float('inf'):.0f} {count or 'vertices'}/s")
+        if len(sys.argv) > 4:
+            with open(sys.argv[4], 'wb') as f: ids.tofile(f)
+        sys.exit()
     from random import randint
     tab = [FindUnionTree() for _ in range(20)]
     for _ in range(20):
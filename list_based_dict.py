@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 # Piotr Beling, 2023
 
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from time import perf_counter
+
 class ListBasedDict:
     """Dictionary that stores a list of key-value pairs and mimics the interface of the built-in dict type."""
         
@@ -69,8 +72,112 @@ class ListBasedDict:
         result = cls()
         for k in iterable: result[k] = value
         return result
-        
+
+
+class HybridListBasedDict(ListBasedDict, MutableMapping):
+    """ListBasedDict that additionally maintains the index (built-in dict) which maps keys to positions in data,
+    but only while it has more than threshold elements. So it is as compact as ListBasedDict when small,
+    and its operations take (expected) constant time when large. Keys must be hashable.
+    Deletion moves the last element into the place of the removed one, so the elements are kept
+    in insertion order only until the first deletion."""
+
+    def __init__(self, iterable = (), threshold = 8):
+        """Constructs a dictionary containing key/value pairs from the given iterable.
+        The index is built when the size exceeds threshold and dropped when the size falls below threshold/2."""
+        self.data = []
+        self.index = None
+        self.threshold = threshold
+        for k, v in iterable: self[k] = v
+
+    def _index_of(self, key):
+        if self.index is not None:
+            return self.index[key]
+        for i, (k, _) in enumerate(self.data):
+            if k == key:
+                return i
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        # new keys are common, so they are recognized without raising KeyError
+        if self.index is None:
+            for i, (k, _) in enumerate(self.data):
+                if k == key:
+                    self.data[i] = (key, value)
+                    return
+            self.data.append((key, value))
+            if len(self.data) > self.threshold:
+                self.index = {k: i for i, (k, _) in enumerate(self.data)}
+        else:
+            i = self.index.get(key)
+            if i is None:
+                self.index[key] = len(self.data)
+                self.data.append((key, value))
+            else:
+                self.data[i] = (key, value)
+
+    def __delitem__(self, key):
+        i = self._index_of(key)
+        last = self.data.pop()
+        if i < len(self.data):
+            self.data[i] = last
+            if self.index is not None: self.index[last[0]] = i
+        if self.index is not None:
+            del self.index[key]
+            if len(self.data) < self.threshold // 2: self.index = None
+
+    def items(self):
+        """Returns the view of (key, value) pairs, like dict.items() (instead of the list used internally)."""
+        return ItemsView(self)
+
+    def values(self):
+        """Returns the view of values, like dict.values()."""
+        return ValuesView(self)
+
+    def popitem(self):
+        """Removes and returns the most recently stored (key, value) pair."""
+        if not self.data:
+            raise KeyError('popitem(): dictionary is empty')
+        key, value = self.data[-1]
+        del self[key]
+        return key, value
+
+    def clear(self):
+        self.data.clear()
+        self.index = None
+
+    def copy(self):
+        return HybridListBasedDict(self.data, self.threshold)
+
+
+def benchmark(sizes = (1, 10, 100, 1000, 10000, 100000), slow_limit = 10000):
+    """Compare the times of inserting, finding and deleting keys in dict, ListBasedDict and HybridListBasedDict.
+    ListBasedDict, whose operations take linear time, is skipped for sizes above slow_limit."""
+    for size in sizes:
+        keys = [str(k) for k in range(size)]
+        repeats = max(1, 100000 // size)
+        for name, construct in (('dict', dict), ('ListBasedDict', ListBasedDict), ('HybridListBasedDict', HybridListBasedDict)):
+            if construct is ListBasedDict and size > slow_limit: continue
+            insert = find = delete = 0.0
+            for _ in range(repeats):
+                start = perf_counter()
+                d = construct()
+                for k in keys: d[k] = k
+                inserted = perf_counter()
+                for k in keys: d[k]
+                found = perf_counter()
+                for k in keys: del d[k]
+                end = perf_counter()
+                insert += inserted - start
+                find += found - inserted
+                delete += end - found
+            ns = 1e9 / (size * repeats)
+            print(f'{size:>6} {name:>19}: insert {insert*ns:8.1f} ns, find {find*ns:8.1f} ns, delete {delete*ns:8.1f} ns')
+
 if __name__ == "__main__":	# demo program:
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark()
+        sys.exit()
     d = ListBasedDict()
     d[1] = "aa"
     d["ab"] = "bb"
@@ -1,3 +1,4 @@
+from array import array
 
 class SegmentTree:
    
@@ -35,6 +36,22 @@ class SegmentTree:
     def __getitem__(self, i):
         return self.data[self._leaf_index(i)]
    
+    def update_many(self, pairs):
+        """Set the i-th element to v for each pair (i, v) in pairs.
+        Writes all leaves first and then recalculates each of their ancestors once, level by level.
+        Dense batches rebuild all internal nodes instead. No element is set if any index is out of range."""
+        pairs = [(self._leaf_index(i), v) for i, v in pairs]
+        dirty = set()
+        for i, v in pairs:
+            self.data[i] = v
+            dirty.add(i // 2)
+        if 4 * len(dirty) >= self.n:
+            for i in range(self.n-1, 0, -1): self._calc_node(i)
+        else:
+            for _ in range(self.n.bit_length() - 1):
+                for i in dirty: self._calc_node(i)
+                dirty = {i // 2 for i in dirty}
+   
     def __str__(self):
         return str(self.data[self.n:])
    
@@ -62,3 +79,259 @@ class SegmentTree:
             l //= 2
             r //= 2
         return self.f(res_l, res_r)
+
+    def _push(self, i):
+        pass    # LazySegmentTree moves pending operations of node i to its children here
+
+    def max_right(self, l, predicate):
+        """Return the largest r such that predicate(in_range(l, r)) is true, or l-1 if there is no such r.
+        predicate must be true for zero and monotone: once false, it must stay false as r grows."""
+        l = self._leaf_index(l)
+        for s in range(self.n.bit_length() - 1, 0, -1): self._push(l >> s)
+        acc = self.zero
+        while True:
+            while l % 2 == 0: l //= 2
+            if not predicate(self.f(acc, self.data[l])):
+                while l < self.n:
+                    self._push(l)
+                    l *= 2
+                    if predicate(self.f(acc, self.data[l])):
+                        acc = self.f(acc, self.data[l])
+                        l += 1
+                return l - self.n - 1
+            acc = self.f(acc, self.data[l])
+            l += 1
+            if l & (l-1) == 0: return len(self) - 1
+
+    def min_left(self, r, predicate):
+        """Return the smallest l such that predicate(in_range(l, r)) is true, or r+1 if there is no such l.
+        predicate must be true for zero and monotone: once false, it must stay false as l decreases."""
+        r = self._leaf_index(r) + 1
+        for s in range(self.n.bit_length() - 1, 0, -1): self._push((r-1) >> s)
+        acc = self.zero
+        while True:
+            r -= 1
+            while r > 1 and r % 2 == 1: r //= 2
+            if not predicate(self.f(self.data[r], acc)):
+                while r < self.n:
+                    self._push(r)
+                    r = 2*r + 1
+                    if predicate(self.f(self.data[r], acc)):
+                        acc = self.f(self.data[r], acc)
+                        r -= 1
+                return r + 1 - self.n
+            acc = self.f(self.data[r], acc)
+            if r & (r-1) == 0: return 0
+
+    def kth(self, k):
+        """Return the index of the element holding the k-th (counting from 0) unit, i.e. the smallest i such that
+        k < in_range(0, i). Only for trees of non-negative integers with sum as f."""
+        if k < 0 or k >= self.data[1]:
+            raise IndexError('SegmentTree kth index out of range')
+        i = 1
+        while i < self.n:
+            self._push(i)
+            i *= 2
+            if self.data[i] <= k:
+                k -= self.data[i]
+                i += 1
+        return i - self.n
+
+
+class LazySegmentTree(SegmentTree):
+    """SegmentTree which additionally supports updating a range (by an operation op) in O(log n) time.
+    apply(op, v, length) returns the value v of the node covering length elements after applying op to all of them,
+    compose(new_op, old_op) returns the operation equivalent to applying old_op and then new_op.
+    The defaults are for adding op to the elements of the range and sum as f.
+    For min or max as f and adding, use apply=lambda op, v, length: v + op."""
+
+    def __init__(self, tab, f=lambda l,r: l+r, zero=0,
+                 apply=lambda op, v, length: v + op * length, compose=lambda new_op, old_op: new_op + old_op):
+        super().__init__(tab, f, zero)
+        self.apply = apply
+        self.compose = compose
+        self.h = self.n.bit_length() - 1
+        self.lazy = [None] * self.n    # operations to apply to the children of the nodes
+
+    def _apply_node(self, i, op):
+        self.data[i] = self.apply(op, self.data[i], self.n >> (i.bit_length() - 1))
+        if i < self.n:
+            self.lazy[i] = op if self.lazy[i] is None else self.compose(op, self.lazy[i])
+
+    def _push(self, i):
+        op = self.lazy[i]
+        if op is not None:
+            self._apply_node(2*i, op)
+            self._apply_node(2*i+1, op)
+            self.lazy[i] = None
+
+    def _push_to(self, leaf):
+        for s in range(self.h, 0, -1): self._push(leaf >> s)
+
+    def __setitem__(self, i, v):
+        self._push_to(self._leaf_index(i))
+        super().__setitem__(i, v)
+
+    def update_many(self, pairs):
+        pairs = list(pairs)
+        leaves = {self._leaf_index(i) for i, _ in pairs}
+        if 4 * len(leaves) >= self.n:
+            for i in range(1, self.n): self._push(i)
+        else:
+            for s in range(self.h, 0, -1):
+                for i in {leaf >> s for leaf in leaves}: self._push(i)
+        super().update_many(pairs)
+
+    def __getitem__(self, i):
+        i = self._leaf_index(i)
+        self._push_to(i)
+        return self.data[i]
+
+    def __str__(self):
+        return str(list(self))
+
+    def __repr__(self):
+        return f'LazySegmentTree({self}, ???)'
+
+    def __iter__(self):
+        for i in range(1, self.n): self._push(i)
+        return super().__iter__()
+
+    def in_range(self, l, r):
+        l = self._leaf_index(l)
+        r = self._leaf_index(r) + 1
+        for s in range(self.h, 0, -1):
+            if (l >> s) << s != l: self._push(l >> s)
+            if (r >> s) << s != r: self._push((r-1) >> s)
+        res_l = self.zero
+        res_r = self.zero
+        while l < r:
+            if l & 1:
+                res_l = self.f(res_l, self.data[l])
+                l += 1
+            if r & 1:
+                r -= 1
+                res_r = self.f(self.data[r], res_r)
+            l //= 2
+            r //= 2
+        return self.f(res_l, res_r)
+
+    def update_range(self, l, r, op):
+        """Apply op to all elements with indices in range [l, r]."""
+        l = self._leaf_index(l)
+        r = self._leaf_index(r) + 1
+        for s in range(self.h, 0, -1):
+            if (l >> s) << s != l: self._push(l >> s)
+            if (r >> s) << s != r: self._push((r-1) >> s)
+        l2, r2 = l, r
+        while l2 < r2:
+            if l2 & 1:
+                self._apply_node(l2, op)
+                l2 += 1
+            if r2 & 1:
+                r2 -= 1
+                self._apply_node(r2, op)
+            l2 //= 2
+            r2 //= 2
+        for s in range(1, self.h + 1):
+            if (l >> s) << s != l: self._calc_node(l >> s)
+            if (r >> s) << s != r: self._calc_node((r-1) >> s)
+
+
+class PersistentSegmentTree:
+    """Segment tree whose every point update creates a new version, leaving the previous ones intact and queryable.
+    Versions share unchanged nodes (path copying), so each update creates only O(log n) new nodes.
+    Nodes are stored in the parallel arrays left, right (indices of the children, -1 for leaves) and value."""
+
+    def _new_node(self, left, right, value):
+        self.left.append(left)
+        self.right.append(right)
+        self.value.append(value)
+        return len(self.value) - 1
+
+    def __init__(self, tab, f=lambda l,r: l+r, zero=0):
+        self.f = f
+        self.zero = zero
+        h = (len(tab)-1).bit_length()
+        self.n = 1 << h # self.n = 2 ** h
+        self.value = list(tab)
+        self.value.extend([zero] * (self.n - len(tab)))
+        self.left = array('i', [-1]) * self.n
+        self.right = array('i', [-1]) * self.n
+        level = range(self.n)   # leaves
+        while len(level) > 1:
+            level = [self._new_node(level[i], level[i+1], f(self.value[level[i]], self.value[level[i+1]]))
+                     for i in range(0, len(level), 2)]
+        self.roots = array('i', level)  # roots of all versions, indexed by version numbers
+
+    def _index(self, i):
+        if i < 0: i += self.n
+        if i < 0 or i >= self.n:
+            raise IndexError('PersistentSegmentTree index out of range')
+        return i
+
+    def __len__(self):
+        return self.n
+
+    def versions(self):
+        """Return the number of versions; the initial one has number 0."""
+        return len(self.roots)
+
+    def update(self, version, i, v):
+        """Create and return the number of the new version, equal to the given one except the i-th element set to v."""
+        i = self._index(i)
+        node = self.roots[version]
+        path = []
+        lo, size = 0, self.n
+        while size > 1:
+            size //= 2
+            went_right = i >= lo + size
+            path.append((node, went_right))
+            if went_right:
+                lo += size
+                node = self.right[node]
+            else:
+                node = self.left[node]
+        node = self._new_node(-1, -1, v)
+        for parent, went_right in reversed(path):
+            l, r = (self.left[parent], node) if went_right else (node, self.right[parent])
+            node = self._new_node(l, r, self.f(self.value[l], self.value[r]))
+        self.roots.append(node)
+        return len(self.roots) - 1
+
+    def get(self, version, i):
+        """Return the i-th element as of the given version."""
+        i = self._index(i)
+        node = self.roots[version]
+        size = self.n
+        while size > 1:
+            size //= 2
+            if i >= size:
+                i -= size
+                node = self.right[node]
+            else:
+                node = self.left[node]
+        return self.value[node]
+
+    def total(self, version):
+        return self.value[self.roots[version]]
+
+    def _in_range(self, node, lo, size, l, r):
+        if l <= lo and lo + size <= r: return self.value[node]
+        size //= 2
+        mid = lo + size
+        res = self.zero
+        if l < mid: res = self._in_range(self.left[node], lo, size, l, r)
+        if r > mid: res = self.f(res, self._in_range(self.right[node], mid, size, l, r))
+        return res
+
+    def in_range(self, version, l, r):
+        """Return f of the elements with indices in range [l, r] as of the given version."""
+        return self._in_range(self.roots[version], 0, self.n, self._index(l), self._index(r) + 1)
+
+    def values(self, version):
+        """Return list of all elements as of the given version."""
+        return [self.get(version, i) for i in range(self.n)]
+
+    def __repr__(self):
+        return f'PersistentSegmentTree({self.values(len(self.roots) - 1)}, ???)'
@@ -1,3 +1,4 @@
+from array import array
 
 class SegmentTree:
    
@@ -33,6 +34,22 @@ class SegmentTree:
     def __getitem__(self, i):
         return self.data[self._leaf_index(i)]
    
+    def update_many(self, pairs):
+        """Set the i-th element to v for each pair (i, v) in pairs.
+        Writes all leaves first and then recalculates each of their ancestors once, level by level.
+        Dense batches rebuild all internal nodes instead. No element is set if any index is out of range."""
+        pairs = [(self._leaf_index(i), v) for i, v in pairs]
+        dirty = set()
+        for i, v in pairs:
+            self.data[i] = v
+            dirty.add(i // 2)
+        if 4 * len(dirty) >= self.n:
+            for i in range(self.n-1, 0, -1): self._calc_node(i)
+        else:
+            for _ in range(self.n.bit_length() - 1):
+                for i in dirty: self._calc_node(i)
+                dirty = {i // 2 for i in dirty}
+   
     def __str__(self):
         return str(self.data[self.n:])
    
@@ -59,3 +76,163 @@ class SegmentTree:
             l //= 2
             r //= 2
         return res
+
+    def max_right(self, l, predicate):
+        """Return the largest r such that predicate(sum_of_range(l, r)) is true, or l-1 if there is no such r.
+        predicate must be true for 0 and monotone: once false, it must stay false as r grows."""
+        l = self._leaf_index(l)
+        acc = 0
+        while True:
+            while l % 2 == 0: l //= 2
+            if not predicate(acc + self.data[l]):
+                while l < self.n:
+                    l *= 2
+                    if predicate(acc + self.data[l]):
+                        acc += self.data[l]
+                        l += 1
+                return l - self.n - 1
+            acc += self.data[l]
+            l += 1
+            if l & (l-1) == 0: return len(self) - 1
+
+    def min_left(self, r, predicate):
+        """Return the smallest l such that predicate(sum_of_range(l, r)) is true, or r+1 if there is no such l.
+        predicate must be true for 0 and monotone: once false, it must stay false as l decreases."""
+        r = self._leaf_index(r) + 1
+        acc = 0
+        while True:
+            r -= 1
+            while r > 1 and r % 2 == 1: r //= 2
+            if not predicate(self.data[r] + acc):
+                while r < self.n:
+                    r = 2*r + 1
+                    if predicate(self.data[r] + acc):
+                        acc += self.data[r]
+                        r -= 1
+                return r + 1 - self.n
+            acc += self.data[r]
+            if r & (r-1) == 0: return 0
+
+    def kth(self, k):
+        """Return the index of the element holding the k-th (counting from 0) unit, i.e. the smallest i such that
+        k < sum_of_range(0, i). Only for trees of non-negative integers."""
+        if k < 0 or k >= self.data[1]:
+            raise IndexError('SegmentTree kth index out of range')
+        i = 1
+        while i < self.n:
+            i *= 2
+            if self.data[i] <= k:
+                k -= self.data[i]
+                i += 1
+        return i - self.n
+
+
+class FenwickTree:
+    """Fenwick tree (binary indexed tree) of 64-bit integers, stored in array('q') of n+1 elements.
+    Offers the same point updates and range sums as SegmentTree, and batch versions of them (which require numpy)."""
+
+    def __init__(self, tab):
+        self.tree = array('q', [0])
+        self.tree.extend(tab)
+        n = len(self.tree) - 1
+        for i in range(1, n+1):   # O(n) build
+            j = i + (i & -i)
+            if j <= n: self.tree[j] += self.tree[i]
+
+    def _index(self, i):
+        n = len(self.tree) - 1
+        if i < 0: i += n
+        if i < 0 or i >= n:
+            raise IndexError('FenwickTree index out of range')
+        return i
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def prefix_sum(self, i):
+        """Return the sum of the elements with indices smaller than i (which, if negative, is increased by len(self))."""
+        tree = self.tree
+        if i < 0: i += len(tree) - 1
+        if i < 0 or i >= len(tree):
+            raise IndexError('FenwickTree index out of range')
+        res = 0
+        while i > 0:
+            res += tree[i]
+            i &= i - 1
+        return res
+
+    def add(self, i, delta):
+        """Add delta to the i-th element."""
+        i = self._index(i) + 1
+        tree = self.tree
+        n = len(tree) - 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def __getitem__(self, i):
+        i = self._index(i)
+        return self.prefix_sum(i+1) - self.prefix_sum(i)
+
+    def __setitem__(self, i, v):
+        self.add(i, v - self[i])
+
+    def __iter__(self):
+        for i in range(len(self)): yield self[i]
+
+    def __str__(self):
+        return str(list(self))
+
+    def __repr__(self):
+        return f'FenwickTree({self})'
+
+    def total(self):
+        return self.prefix_sum(len(self))
+
+    def sum_of_range(self, l, r):
+        return self.prefix_sum(self._index(r)+1) - self.prefix_sum(self._index(l))
+
+    def _numpy_tree(self):
+        import numpy as np
+        return np, np.frombuffer(self.tree, np.int64)
+
+    def _numpy_indices(self, np, indices, end):
+        """Return a new numpy array of indices, the negative ones increased by len(self), checked to be smaller than end."""
+        indices = np.array(indices, np.int64)
+        indices[indices < 0] += len(self)
+        if indices.size != 0 and (indices.min() < 0 or indices.max() >= end):
+            raise IndexError('FenwickTree index out of range')
+        return indices
+
+    def prefix_sums(self, indices):
+        """Return numpy array of prefix_sum(i) for each i in indices."""
+        np, tree = self._numpy_tree()
+        indices = self._numpy_indices(np, indices, len(self) + 1)
+        res = np.zeros(len(indices), np.int64)
+        active = indices > 0
+        while active.any():
+            res[active] += tree[indices[active]]
+            indices &= indices - 1
+            active = indices > 0
+        return res
+
+    def sum_of_ranges(self, ls, rs):
+        """Return numpy array of sum_of_range(l, r) for each pair l, r of ls and rs."""
+        np, _ = self._numpy_tree()
+        n = len(self)
+        return self.prefix_sums(self._numpy_indices(np, rs, n) + 1) - self.prefix_sums(self._numpy_indices(np, ls, n))
+
+    def add_many(self, indices, deltas):
+        """For each pair i, delta of indices and deltas, add delta to the i-th element."""
+        np, tree = self._numpy_tree()
+        indices = self._numpy_indices(np, indices, len(self)) + 1
+        deltas = np.asarray(deltas, np.int64)
+        deltas = np.broadcast_to(deltas, indices.shape)
+        n = len(self)
+        active = indices <= n
+        while active.any():
+            indices = indices[active]
+            deltas = deltas[active]
+            np.add.at(tree, indices, deltas)
+            indices += indices & -indices
+            active = indices <= n